@@ -0,0 +1,99 @@
+import base64
+from functools import partial
+import lzma
+import zlib
+from typing import Callable, Protocol
+
+MAX_DECOMPRESSED_SIZE: int = 4 * 1024 * 1024
+LZMA_PRESET: int = 1    # The default of 6 allocates ~100 MB per message.
+
+
+class Decompressor(Protocol):
+  """Incremental decompressor that can bound the size of its output."""
+  eof: bool
+
+  def decompress(self, data: bytes, max_length: int = ...) -> bytes:
+    ...
+
+
+Codec = tuple[Callable[[bytes], bytes], Callable[[], Decompressor]]
+
+CODECS: dict[str, Codec] = {
+    "zlib": (zlib.compress, zlib.decompressobj),
+    "lzma": (partial(lzma.compress, preset=LZMA_PRESET), lzma.LZMADecompressor),
+}
+
+
+class Compressor:
+  """Compresses message text before it is encrypted.
+
+  Ciphertext does not compress, so compression happens on the clients and the
+  server relays compressed messages without inflating them. Only codecs that
+  every member of the chatroom accepts are used.
+  """
+  threshold: int
+  codecs: list[str]
+  accepted: list[str]
+
+  def __init__(self,
+               threshold: int = 512,
+               codecs: tuple[str, ...] = ("zlib", "lzma")) -> None:
+    self.threshold = threshold
+    self.codecs = [codec for codec in codecs if codec in CODECS]
+    self.accepted = []
+
+  @property
+  def offer(self) -> str:
+    """Returns the supported codecs, in order of preference."""
+    return ",".join(self.codecs)
+
+  def negotiate(self, encoding: str) -> None:
+    """Accepts the supported codecs among those shared by the chatroom."""
+    shared: list[str] = encoding.split(",")
+    self.accepted = [codec for codec in self.codecs if codec in shared]
+
+  def compress(self, text: str) -> tuple[str, str]:
+    """Returns the text, compressed if that makes it smaller, and its encoding.
+
+    Text below the size threshold is never compressed.
+    """
+    data: bytes = text.encode()
+    if len(data) < self.threshold or not self.accepted:
+      return text, ""
+
+    codec: str = self.accepted[0]
+    compress, _ = CODECS[codec]
+    compressed: bytes = base64.b64encode(compress(data))
+    if len(compressed) >= len(data):
+      return text, ""
+
+    return compressed.decode(), codec
+
+  @staticmethod
+  def decompress(text: str,
+                 encoding: str,
+                 limit: int = MAX_DECOMPRESSED_SIZE) -> str:
+    """Reverts text compressed with the given encoding.
+
+    Raises ValueError if the text is malformed or would decompress to more
+    than limit bytes.
+    """
+    if not encoding:
+      return text
+
+    if encoding not in CODECS:
+      raise ValueError(f"Unsupported encoding: {encoding}")
+
+    _, decompressor = CODECS[encoding]
+    inflater: Decompressor = decompressor()
+    try:
+      data: bytes = inflater.decompress(base64.b64decode(text), limit + 1)
+    except (zlib.error, lzma.LZMAError) as error:
+      raise ValueError(f"Malformed {encoding} data") from error
+
+    if len(data) > limit:
+      raise ValueError(f"Decompressed text exceeds {limit} bytes")
+    if not inflater.eof:
+      raise ValueError(f"Truncated {encoding} data")
+
+    return data.decode()
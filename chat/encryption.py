@@ -7,6 +7,8 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+from utilities.profiler import profiler
+
 
 class Encryption(Protocol):
   """A protocol that has encrypt and decrypt methods."""
@@ -82,10 +84,12 @@ class PasswordEncryption:
     key: bytes = KeyGen.generate_hash(password)
     self.encrypter = Fernet(key)
 
+  @profiler.span("encrypt")
   def encrypt(self, data: str) -> str:
     """Encrypts data from a key generated from a password."""
     return self.encrypter.encrypt(data.encode()).decode()
 
+  @profiler.span("decrypt")
   def decrypt(self, data: str) -> str:
     """Decrypts data from a key generated from a password."""
     return self.encrypter.decrypt(data.encode()).decode()
@@ -0,0 +1,141 @@
+from __future__ import annotations
+import hashlib
+import hmac
+import re
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+  from chat.encryption import Encryption
+
+HistoryEntry = tuple[str, str]
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    contents TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_chat ON messages (chat_id, id);
+CREATE TABLE IF NOT EXISTS postings (
+    token BLOB NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (token, message_id)
+) WITHOUT ROWID;
+"""
+
+
+class MessageHistory:
+  """A local store of decrypted chat history with a full-text index.
+
+  Senders and contents are encrypted before they are written to disk. Words
+  and senders are indexed as keyed hashes, so lookups never decrypt more than
+  the messages they return. Once closed, adding and searching do nothing, so
+  the receiving thread can still call them while the client logs out.
+  """
+  path: Path = Path("history.db")
+  encryption: Encryption
+  index_key: bytes
+  database: sqlite3.Connection
+  lock: Lock
+  closed: bool
+
+  def __init__(self,
+               encryption: Encryption,
+               index_key: bytes,
+               path: Path | None = None) -> None:
+    self.encryption = encryption
+    self.index_key = index_key
+    self.path = path or self.path
+    self.lock = Lock()
+    self.closed = False
+    self.database = sqlite3.connect(self.path, check_same_thread=False)
+    self.database.execute("PRAGMA journal_mode=WAL")
+    self.database.execute("PRAGMA synchronous=NORMAL")
+    self.database.executescript(SCHEMA)
+
+  @staticmethod
+  def tokenize(text: str) -> set[str]:
+    """Splits text into the set of lowercase words it contains."""
+    return set(re.findall(r"\w+", text.lower()))
+
+  def hash_term(self, chat_id: str, term: str) -> bytes:
+    """Returns a keyed hash of a search term scoped to a chatroom."""
+    data: bytes = f"{chat_id}\0{term}".encode()
+    return hmac.new(self.index_key, data, hashlib.sha256).digest()[:16]
+
+  def terms(self, chat_id: str, keywords: str, sender: str) -> list[bytes]:
+    """Returns the index terms for keywords and an optional sender.
+
+    Senders are indexed as "@sender", which no tokenized word can match.
+    """
+    terms: list[bytes] = [
+        self.hash_term(chat_id, token) for token in self.tokenize(keywords)
+    ]
+    if sender:
+      terms.append(self.hash_term(chat_id, f"@{sender}"))
+    return terms
+
+  def add_message(self, chat_id: str, sender: str, contents: str) -> int:
+    """Stores a message and adds its words and sender to the index.
+
+    Returns the message's id, or 0 if the history is closed.
+    """
+    terms: Iterable[bytes] = self.terms(chat_id, contents, sender)
+
+    with self.lock:
+      if self.closed:
+        return 0
+      with self.database:
+        cursor: sqlite3.Cursor = self.database.execute(
+            "INSERT INTO messages (chat_id, sender, contents) "
+            "VALUES (?, ?, ?)", (chat_id, self.encryption.encrypt(sender),
+                                 self.encryption.encrypt(contents)))
+        message_id: int = cursor.lastrowid or 0
+        self.database.executemany(
+            "INSERT OR IGNORE INTO postings (token, message_id) VALUES (?, ?)",
+            ((term, message_id) for term in terms))
+
+    return message_id
+
+  def search(self,
+             chat_id: str,
+             keywords: str = "",
+             sender: str = "",
+             limit: int = 50) -> list[HistoryEntry]:
+    """Returns the newest messages containing every keyword, oldest first.
+
+    Results can be narrowed to a single sender. Without keywords or sender,
+    the latest messages in the chatroom are returned.
+    """
+    terms: list[bytes] = self.terms(chat_id, keywords, sender)
+    query: str = ("SELECT sender, contents FROM messages WHERE chat_id = ? "
+                  "ORDER BY id DESC LIMIT ?")
+    parameters: list[str | bytes | int] = [chat_id, limit]
+
+    if terms:
+      # Terms are already scoped to the chatroom, so matching messages are
+      # found from the posting lists alone and looked up by id.
+      matches: str = " INTERSECT ".join(
+          ["SELECT message_id FROM postings WHERE token = ?"] * len(terms))
+      query = ("SELECT sender, contents FROM messages WHERE id IN ("
+               f"{matches} ORDER BY message_id DESC LIMIT ?) ORDER BY id DESC")
+      parameters = [*terms, limit]
+
+    with self.lock:
+      if self.closed:
+        return []
+      rows: list[tuple[str, str]] = self.database.execute(
+          query, parameters).fetchall()
+
+    return [(self.encryption.decrypt(sender), self.encryption.decrypt(contents))
+            for sender, contents in reversed(rows)]
+
+  def close(self) -> None:
+    """Closes the history database."""
+    with self.lock:
+      self.closed = True
+      self.database.close()
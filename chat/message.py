@@ -2,6 +2,7 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from enum import auto, Enum
 
+from chat.compression import Compressor
 from chat.encryption import Encryption
 
 
@@ -21,24 +22,38 @@ class MessageType(str, Enum):
 
 
 class Message(ABC):
-  """An extensible abstract message class."""
+  """An extensible abstract message class.
+
+  The encoding names the codec a chat message's contents were compressed with.
+  On connect and disconnect messages it lists the codecs a client accepts, or
+  the codecs every member of the chat accepts when sent by the server.
+  """
   message_type: str
   sender: str
   chat_id: str
   contents: str
+  encoding: str
 
-  def __init__(self, sender: str, contents: str, chat_id: str) -> None:
+  def __init__(self,
+               sender: str,
+               contents: str,
+               chat_id: str,
+               encoding: str = "") -> None:
     self.sender = sender
     self.contents = contents
     self.chat_id = chat_id
+    self.encoding = encoding
 
   def jsonify(self) -> dict[str, str]:
-    return {
+    json_message: dict[str, str] = {
         "type": self.message_type,
         "sender": self.sender,
         "chat_id": self.chat_id,
         "contents": self.contents
     }
+    if self.encoding:
+      json_message["encoding"] = self.encoding
+    return json_message
 
   @classmethod
   @abstractmethod
@@ -52,8 +67,12 @@ class Message(ABC):
 
 class ChatMessage(Message):
 
-  def __init__(self, sender: str, contents: str, chat_id: str) -> None:
-    super().__init__(sender, contents, chat_id)
+  def __init__(self,
+               sender: str,
+               contents: str,
+               chat_id: str,
+               encoding: str = "") -> None:
+    super().__init__(sender, contents, chat_id, encoding)
     self.message_type = MessageType.MESSAGE
 
   def __str__(self) -> str:
@@ -66,6 +85,7 @@ class ChatMessage(Message):
         json_message["sender"],
         json_message["contents"],
         json_message["chat_id"],
+        json_message.get("encoding", ""),
     )
 
   def generate_response(self) -> ChatMessage:
@@ -75,9 +95,13 @@ class ChatMessage(Message):
 
 class SystemMessage(Message):
 
-  def __init__(self, sender: str, contents: str, chat_id: str,
-               message_type: str) -> None:
-    super().__init__(sender, contents, chat_id)
+  def __init__(self,
+               sender: str,
+               contents: str,
+               chat_id: str,
+               message_type: str,
+               encoding: str = "") -> None:
+    super().__init__(sender, contents, chat_id, encoding)
     self.message_type = message_type
 
   @classmethod
@@ -88,6 +112,7 @@ class SystemMessage(Message):
         json_message["contents"],
         json_message["chat_id"],
         json_message["type"],
+        json_message.get("encoding", ""),
     )
 
   def generate_response(self) -> SystemMessage:
@@ -98,6 +123,7 @@ class SystemMessage(Message):
         f"{self.contents}",
         self.chat_id,
         self.message_type,
+        self.encoding,
     )
 
 
@@ -106,12 +132,17 @@ class MessageFactory:
   username: str
   chatroom: str
   encryption: Encryption
+  compressor: Compressor
 
-  def __init__(self, username: str, chatroom: str,
-               encryption: Encryption) -> None:
+  def __init__(self,
+               username: str,
+               chatroom: str,
+               encryption: Encryption,
+               compressor: Compressor | None = None) -> None:
     self.username = username
     self.chatroom = chatroom
     self.encryption = encryption
+    self.compressor = compressor or Compressor()
 
   @staticmethod
   def from_json(json_message: dict[str, str]) -> SystemMessage | ChatMessage:
@@ -119,10 +150,10 @@ class MessageFactory:
 
     message_type = json_message["type"]
 
-    if message_type in (MessageType.CONNECT, MessageType.DISCONNECT):
-      return SystemMessage.from_json(json_message)
+    if message_type == MessageType.MESSAGE:
+      return ChatMessage.from_json(json_message)
 
-    return ChatMessage.from_json(json_message)
+    return SystemMessage.from_json(json_message)
 
   def generate_login_message(self) -> SystemMessage:
     return SystemMessage(
@@ -130,6 +161,7 @@ class MessageFactory:
         self.encryption.encrypt(f"{self.username} connected"),
         self.chatroom,
         MessageType.CONNECT,
+        self.compressor.offer,
     )
 
   def generate_logout_message(self) -> SystemMessage:
@@ -141,8 +173,10 @@ class MessageFactory:
     )
 
   def generate_message(self, message: str) -> ChatMessage:
+    contents, encoding = self.compressor.compress(message)
     return ChatMessage(
         self.username,
-        self.encryption.encrypt(message),
+        self.encryption.encrypt(contents),
         self.chatroom,
+        encoding,
     )
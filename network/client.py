@@ -1,30 +1,39 @@
 from datetime import datetime, timedelta
+import sys
 from threading import Thread
 from typing import NoReturn
 
+from chat.compression import Compressor
 from chat.encryption import KeyGen, PasswordEncryption
-from chat.message import ChatMessage, MessageFactory, SystemMessage
-from network.config import ClientConfig, Config
+from chat.history import HistoryEntry, MessageHistory
+from chat.message import ChatMessage, MessageFactory, MessageType, SystemMessage
+from network.config import ClientConfig
 from network.device import Device
 from user.user import User
+from utilities.profiler import profiler
 
 #TODO: Add database verification and registration.
 
 DELETE_PREV_LINE: str = "\033[F\033[K"
+UNREADABLE_MESSAGE: str = "[Unreadable message]"
 
 
 class ChatClient(Device):
   """Chat client that transmits messages to the server."""
-  config: Config
+  config: ClientConfig
   chatroom: str
   time_zone: timedelta
   user: User
   encryption: PasswordEncryption
   message_factory: MessageFactory
+  history: MessageHistory | None
 
-  def __init__(self, debug: bool = False) -> None:
+  def __init__(self, debug: bool = False, keep_history: bool = False) -> None:
+    super().__init__()
     self.config = ClientConfig(debug)
+    self.config.keep_history = keep_history or self.config.keep_history
     self.chatroom = ""
+    self.history = None
     self.time_zone = datetime.now().astimezone().utcoffset() or timedelta(0)
 
   def connect_to_server(self) -> None:
@@ -37,6 +46,7 @@ class ChatClient(Device):
     """Ask for credentials and send login request to the server."""
     self.request_credentials()
     self.server.connect(self.server_address)
+    self.open_connection(self.server)
     self.send_login_message()
 
   def request_credentials(self) -> None:
@@ -51,8 +61,13 @@ class ChatClient(Device):
     """Create components that enable chat message encryption."""
     self.chatroom = KeyGen.generate_hash(chatroom, password).decode()
     self.encryption: PasswordEncryption = PasswordEncryption(password)
+    compressor: Compressor = Compressor(self.config.compression_threshold,
+                                        self.config.compression_codecs)
     self.message_factory = MessageFactory(self.username, self.chatroom,
-                                          self.encryption)
+                                          self.encryption, compressor)
+    if self.config.keep_history:
+      history_key: bytes = KeyGen.generate_hash(password, chatroom)
+      self.history = MessageHistory(self.encryption, history_key)
 
   def await_incoming_messages(self) -> None:
     """Creates a thread to display any incoming encrypted messages."""
@@ -64,6 +79,11 @@ class ChatClient(Device):
     while True:
       encrypted_message: SystemMessage | ChatMessage = self.receive_message(
           self.server)
+
+      if encrypted_message.message_type in (MessageType.CONNECT,
+                                            MessageType.DISCONNECT):
+        self.message_factory.compressor.negotiate(encrypted_message.encoding)
+
       message: str = self.decrypt_message(encrypted_message)
       print(message)
 
@@ -71,13 +91,37 @@ class ChatClient(Device):
     """Decrypts an incoming message."""
     sender: str = message.sender
     contents: str = self.encryption.decrypt(message.contents)
+
+    if message.message_type == MessageType.MESSAGE:
+      try:
+        contents = Compressor.decompress(contents, message.encoding)
+      except ValueError:
+        return f"{sender}: {UNREADABLE_MESSAGE}"
+
+    if self.history and message.message_type == MessageType.MESSAGE:
+      self.history.add_message(message.chat_id, sender, contents)
+
     return f"{sender}: {contents}"
 
+  def search_history(self, query: str) -> list[HistoryEntry]:
+    """Searches chat history for messages matching the query.
+
+    Words prefixed with "@" filter by sender, the rest are keywords.
+    """
+    if not self.history:
+      return []
+
+    words: list[str] = query.split()
+    senders: list[str] = [word[1:] for word in words if word.startswith("@")]
+    keywords: str = " ".join(word for word in words if not word.startswith("@"))
+    sender: str = senders[-1] if senders else ""
+    return self.history.search(self.chatroom, keywords, sender)
+
   def await_outgoing_messages(self) -> None:
     """Sends user input as messages to the server."""
     while True:
 
-      user_input: str = input()
+      user_input: str = self.read_input()
       print(DELETE_PREV_LINE, end="")
 
       if not user_input:
@@ -87,8 +131,23 @@ class ChatClient(Device):
         self.send_logout_message()
         break
 
+      if user_input == self.config.profile_command:
+        profiler.toggle()
+        continue
+
+      command, _, query = user_input.partition(" ")
+      if command == self.config.search_command:
+        for sender, contents in self.search_history(query):
+          print(f"[HISTORY] {sender}: {contents}")
+        continue
+
       self.send_chat_message(user_input)
 
+  @profiler.idle
+  def read_input(self) -> str:
+    """Waits for a line of user input."""
+    return input()
+
   def send_login_message(self) -> None:
     """Notifies the server of user connecting to the chat."""
     self.send_message(self.server,
@@ -98,7 +157,10 @@ class ChatClient(Device):
     """Notifies the server of user leaving the chat."""
     self.send_message(self.server,
                       self.message_factory.generate_logout_message())
-    self.server.close()
+    self.close_connection(self.server)
+
+    if self.history:
+      self.history.close()
 
   def send_chat_message(self, contents: str) -> None:
     """Sends user's message to the server to forward to chat participants."""
@@ -108,5 +170,7 @@ class ChatClient(Device):
 
 if __name__ == "__main__":
   debug: bool = True
-  client: ChatClient = ChatClient(debug)
+  keep_history: bool = "--keep-history" in sys.argv
+  client: ChatClient = ChatClient(debug, keep_history)
+  profiler.toggle_on_signal()
   client.connect_to_server()
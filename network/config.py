@@ -6,6 +6,7 @@ from urllib.request import urlopen
 
 class Config(Protocol):
   header_size: int
+  chunk_size: int
   host: str
   port: int
   connect_command: str
@@ -15,10 +16,13 @@ class Config(Protocol):
 class ServerConfig:
   """Initializes Server settings."""
   header_size: int = 16
+  chunk_size: int = 16384
   host: str
   port: int = 5190
   connect_command: str = "/connect"
   disconnect_command: str = "/disconnect"
+  handoff_path: str = "cryptchat.sock"
+  poll_interval: float = 0.5
 
   def __init__(self, debug=False) -> None:
     if debug:
@@ -36,10 +40,16 @@ class ServerConfig:
 class ClientConfig:
   """Initializes Client settings."""
   header_size: int = 16
+  chunk_size: int = 16384
   host: str = "71.245.250.47"
   port: int = 5190
   connect_command: str = "/connect"
   disconnect_command: str = "/disconnect"
+  search_command: str = "/search"
+  profile_command: str = "/profile"
+  compression_threshold: int = 512
+  compression_codecs: tuple[str, ...] = ("zlib", "lzma")
+  keep_history: bool = False
 
   def __init__(self, debug: bool = False) -> None:
     if debug:
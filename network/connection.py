@@ -9,6 +9,8 @@ class ClientConnection:
   client: socket
   ip: str
   port: int
+  encodings: set[str]
 
   def __init__(self, connection: IncomingConnection) -> None:
     self.client, (self.ip, self.port) = connection
+    self.encodings = set()
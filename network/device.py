@@ -1,15 +1,29 @@
 from abc import ABC
 import json
 from socket import AF_INET, SOCK_STREAM, socket
+from threading import Lock
 from chat.message import ChatMessage, Message, MessageFactory, SystemMessage
 
 from network.config import Config
+from network.scheduler import OutboundScheduler, Priority
+from utilities.profiler import profiler
+
+CONTINUED_FRAME: str = "+"
+FINAL_FRAME: str = "$"
 
 
 class Device(ABC):
   """A device capable of receiving and sending data."""
   config: Config
   server: socket = socket(AF_INET, SOCK_STREAM)
+  outbound: dict[socket, OutboundScheduler]
+  outbound_lock: Lock
+  partial_frames: dict[socket, bytearray]
+
+  def __init__(self) -> None:
+    self.outbound = {}
+    self.outbound_lock = Lock()
+    self.partial_frames = {}
 
   @property
   def server_address(self) -> tuple[str, int]:
@@ -20,24 +34,100 @@ class Device(ABC):
   def connect(self) -> None:
     """Connects to another node."""
 
+  @profiler.span("send_message")
   def send_message(self, server: socket, message: Message) -> None:
-    """Send message."""
+    """Queue message to be sent according to its priority.
+
+    Messages to connections without an outbound scheduler, such as ones that
+    were just closed, are dropped.
+    """
+    with self.outbound_lock:
+      scheduler: OutboundScheduler | None = self.outbound.get(server)
+    if not scheduler:
+      return
+
     json_message: str = json.dumps(message.jsonify())
     encoded_message: bytes = json_message.encode()
-    self._send_header(server, encoded_message)
-    server.send(encoded_message)
+    priority: Priority = Priority.of(message.message_type)
+    frames: list[bytes] = self._frame(encoded_message, priority)
+    scheduler.submit(frames, priority, message.chat_id)
+
+  def open_connection(self, server: socket) -> None:
+    """Start the outbound scheduler of a new connection."""
+    with self.outbound_lock:
+      if server not in self.outbound:
+        self.outbound[server] = OutboundScheduler(server,
+                                                  self.config.chunk_size)
+
+  def close_connection(self, server: socket) -> None:
+    """Send any queued messages and close the connection."""
+    with self.outbound_lock:
+      scheduler: OutboundScheduler | None = self.outbound.pop(server, None)
+
+    if scheduler:
+      scheduler.close()
+    self.partial_frames.pop(server, None)
+    server.close()
+
+  def _frame(self, message: bytes, priority: Priority) -> list[bytes]:
+    """Split message into frames, chunking bulk messages.
 
-  def _send_header(self, server: socket, message: bytes) -> None:
-    """Send message header."""
-    header: str = f"{len(message):<{self.config.header_size}}"
-    server.send(header.encode())
+    Chunks of a bulk message may be interleaved with more urgent messages.
+    """
+    chunk_size: int = self.config.chunk_size
+    if priority < Priority.BULK or len(message) <= chunk_size:
+      return [self._header(message) + message]
+
+    chunks: list[bytes] = [
+        message[start:start + chunk_size]
+        for start in range(0, len(message), chunk_size)
+    ]
+    frames: list[bytes] = [
+        self._header(chunk, CONTINUED_FRAME) + chunk for chunk in chunks[:-1]
+    ]
+    frames.append(self._header(chunks[-1], FINAL_FRAME) + chunks[-1])
+    return frames
+
+  def _header(self, message: bytes, flag: str = "") -> bytes:
+    """Return message header."""
+    header: str = f"{len(message)}{flag}"
+    return f"{header:<{self.config.header_size}}".encode()
 
   def receive_message(self, client: socket) -> SystemMessage | ChatMessage:
     """Return incoming message."""
-    header: str = client.recv(self.config.header_size).decode()
-    buffer_size: int = int(header)
-    response: bytes = client.recv(buffer_size)
+    while True:
+      header: str = self._receive(client,
+                                  self.config.header_size).decode().strip()
+      length: str = header.rstrip(CONTINUED_FRAME + FINAL_FRAME)
+      flag: str = header[len(length):]
+      response: bytes = self._receive(client, int(length))
+
+      if flag == CONTINUED_FRAME:
+        self.partial_frames.setdefault(client, bytearray()).extend(response)
+        continue
+
+      if flag == FINAL_FRAME:
+        partial: bytearray = self.partial_frames.pop(client, bytearray())
+        response = bytes(partial + response)
+      break
+
+    return self._parse(response)
+
+  @profiler.span("parse_message")
+  def _parse(self, response: bytes) -> SystemMessage | ChatMessage:
+    """Return the message in a received payload."""
     message: str = response.decode()
     json_message: dict[str, str] = json.loads(message)
 
     return MessageFactory.from_json(json_message)
+
+  @profiler.idle
+  def _receive(self, client: socket, size: int) -> bytes:
+    """Return exactly size bytes from the connection."""
+    data: bytearray = bytearray()
+    while len(data) < size:
+      chunk: bytes = client.recv(size - len(data))
+      if not chunk:
+        raise ConnectionError("Connection closed by peer.")
+      data += chunk
+    return bytes(data)
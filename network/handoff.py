@@ -0,0 +1,50 @@
+import json
+from socket import recv_fds, send_fds, socket
+from typing import Any
+
+HEADER_SIZE: int = 16
+MAX_FDS_PER_MESSAGE: int = 250    # Linux accepts at most 253 per message.
+
+HandoffState = dict[str, Any]
+
+
+def send_sockets(channel: socket, state: HandoffState,
+                 sockets: list[socket]) -> None:
+  """Sends server state and open sockets to another process.
+
+  The channel must be a Unix domain socket. File descriptors are passed with
+  SCM_RIGHTS, so the receiving process shares the same open connections.
+  """
+  state = {**state, "sockets": len(sockets)}
+  payload: bytes = json.dumps(state).encode()
+  channel.sendall(f"{len(payload):<{HEADER_SIZE}}".encode() + payload)
+
+  for start in range(0, len(sockets), MAX_FDS_PER_MESSAGE):
+    batch: list[socket] = sockets[start:start + MAX_FDS_PER_MESSAGE]
+    send_fds(channel, [b"\0"], [sock.fileno() for sock in batch])
+
+
+def receive_sockets(channel: socket) -> tuple[HandoffState, list[socket]]:
+  """Receives server state and open sockets sent by send_sockets."""
+  header: bytes = _receive(channel, HEADER_SIZE)
+  state: HandoffState = json.loads(_receive(channel, int(header)))
+  fds: list[int] = []
+
+  while len(fds) < state["sockets"]:
+    _, received, _, _ = recv_fds(channel, 1, MAX_FDS_PER_MESSAGE)
+    if not received:
+      raise ConnectionError("Handoff ended before all sockets were received.")
+    fds.extend(received)
+
+  return state, [socket(fileno=fd) for fd in fds]
+
+
+def _receive(channel: socket, size: int) -> bytes:
+  """Returns exactly size bytes without reading into passed descriptors."""
+  data: bytearray = bytearray()
+  while len(data) < size:
+    chunk: bytes = channel.recv(size - len(data))
+    if not chunk:
+      raise ConnectionError("Handoff ended before state was received.")
+    data += chunk
+  return bytes(data)
@@ -0,0 +1,278 @@
+from __future__ import annotations
+from collections import OrderedDict, deque
+from enum import IntEnum
+from socket import SHUT_RDWR, SOL_SOCKET, SO_ERROR, SO_SNDBUF
+import struct
+from threading import Condition, Thread
+from typing import TYPE_CHECKING
+
+from chat.message import MessageType
+from utilities.profiler import profiler
+
+try:
+  import fcntl
+  import termios
+except ImportError:    # Windows has neither, so fall back to SO_SNDBUF.
+  fcntl = None
+  termios = None
+
+if TYPE_CHECKING:
+  from socket import socket
+
+
+class Priority(IntEnum):
+  """Outbound priority classes, most urgent first."""
+  CONTROL = 0
+  CHAT = 1
+  BULK = 2
+
+  @classmethod
+  def of(cls, message_type: str) -> Priority:
+    """Returns the priority class of a message type."""
+    return MESSAGE_PRIORITIES.get(message_type, cls.CHAT)
+
+
+MESSAGE_PRIORITIES: dict[str, Priority] = {
+    MessageType.CONNECT: Priority.CONTROL,
+    MessageType.DISCONNECT: Priority.CONTROL,
+    MessageType.COMMAND: Priority.CONTROL,
+    MessageType.MESSAGE: Priority.CHAT,
+    MessageType.NOTICE: Priority.CHAT,
+    MessageType.FILE: Priority.BULK,
+}
+
+Frames = deque[bytes]
+
+BULK_WINDOW: int = 8    # Most bulk chunks queued in the socket at once.
+BULK_POLL_INTERVAL: float = 0.001
+MAX_QUEUED_BYTES: int = 32 * 2**20    # Beyond this the peer is not reading.
+FLUSH_TIMEOUT: float = 5.0
+TIOCOUTQ: int | None = getattr(termios, "TIOCOUTQ", None)
+
+
+class RoomQueue:
+  """Interleaves queued frames between chatrooms using deficit round robin.
+
+  Each room may send up to its weight times the quantum in bytes per turn.
+  Once a multi-frame item has started, its remaining frames are sent before
+  any other item in the queue.
+  """
+  quantum: int
+  weights: dict[str, int]
+  rooms: OrderedDict[str, deque[tuple[int, Frames]]]
+  deficits: dict[str, int]
+  partial: Frames | None
+
+  def __init__(self, quantum: int) -> None:
+    self.quantum = quantum
+    self.weights = {}
+    self.rooms = OrderedDict()
+    self.deficits = {}
+    self.partial = None
+
+  def __bool__(self) -> bool:
+    return bool(self.partial or self.rooms)
+
+  def push(self, chat_id: str, frames: list[bytes]) -> None:
+    """Queues an item made up of one or more frames for a room."""
+    size: int = sum(len(frame) for frame in frames)
+    self.rooms.setdefault(chat_id, deque()).append((size, deque(frames)))
+    self.deficits.setdefault(chat_id, 0)
+
+  def pop(self) -> bytes | None:
+    """Returns the next frame to send, or None if the queue is empty."""
+    if self.partial:
+      return self._pop_partial()
+
+    while self.rooms:
+      chat_id, items = next(iter(self.rooms.items()))
+      size, frames = items[0]
+
+      if self.deficits[chat_id] < size:
+        self.deficits[chat_id] += self.quantum * self.weights.get(chat_id, 1)
+        self.rooms.move_to_end(chat_id)
+        continue
+
+      self.deficits[chat_id] -= size
+      items.popleft()
+      if not items:
+        del self.rooms[chat_id]
+        del self.deficits[chat_id]
+
+      self.partial = frames
+      return self._pop_partial()
+
+    return None
+
+  def _pop_partial(self) -> bytes:
+    """Returns the next frame of the item currently being sent."""
+    assert self.partial
+    frame: bytes = self.partial.popleft()
+    if not self.partial:
+      self.partial = None
+    return frame
+
+
+class OutboundScheduler:
+  """Sends frames over a connection in priority order on a dedicated thread.
+
+  Higher priority frames are always sent first. Bulk chunks are only written
+  while few bytes are still waiting in the socket, so the kernel buffers never
+  hold more than a few chunks ahead of a more urgent frame. A peer that stops
+  reading is disconnected once max_queued bytes are waiting to be sent.
+  """
+  connection: socket
+  queues: list[RoomQueue]
+  condition: Condition
+  pending: int
+  queued_bytes: int
+  closed: bool
+  max_unsent: int
+  max_queued: int
+  thread: Thread
+
+  def __init__(self,
+               connection: socket,
+               quantum: int,
+               max_queued: int = MAX_QUEUED_BYTES) -> None:
+    self.connection = connection
+    self.queues = [RoomQueue(quantum) for _ in Priority]
+    self.condition = Condition()
+    self.pending = 0
+    self.queued_bytes = 0
+    self.closed = False
+    self.max_unsent = BULK_WINDOW * quantum
+    self.max_queued = max_queued
+
+    if TIOCOUTQ is None:
+      connection.setsockopt(SOL_SOCKET, SO_SNDBUF, self.max_unsent)
+
+    self.thread = Thread(target=self.send_frames, daemon=True)
+    self.thread.start()
+
+  def submit(self, frames: list[bytes], priority: Priority,
+             chat_id: str) -> None:
+    """Queues frames that must be sent in order for a chatroom.
+
+    Aborts the connection instead if that would queue more than max_queued
+    bytes.
+    """
+    size: int = sum(len(frame) for frame in frames)
+    with self.condition:
+      if self.closed:
+        return
+      if self.queued_bytes + size > self.max_queued:
+        self.abort()
+        return
+      self.queues[priority].push(chat_id, frames)
+      self.pending += len(frames)
+      self.queued_bytes += size
+      self.condition.notify_all()
+
+  def set_weight(self, chat_id: str, weight: int) -> None:
+    """Sets a chatroom's share of bandwidth relative to other chatrooms."""
+    with self.condition:
+      for queue in self.queues:
+        queue.weights[chat_id] = max(1, weight)
+
+  def unsent_bytes(self) -> int:
+    """Returns the bytes queued in the socket but not yet delivered."""
+    if fcntl is None or TIOCOUTQ is None:
+      return 0
+
+    try:
+      unsent: bytes = fcntl.ioctl(self.connection, TIOCOUTQ, b"\0" * 4)
+    except OSError:
+      return 0
+    return struct.unpack("i", unsent)[0]
+
+  def connection_failed(self) -> bool:
+    """Returns whether the connection has failed, such as by a peer reset."""
+    try:
+      return bool(self.connection.getsockopt(SOL_SOCKET, SO_ERROR))
+    except OSError:
+      return True
+
+  def next_frame(self) -> bytes | None:
+    """Waits for the most urgent frame that can be sent. None once closed.
+
+    Bulk frames wait until the socket has room within the bulk window, while
+    more urgent frames can still be picked. Queued frames are dropped if the
+    connection fails while waiting.
+    """
+    with self.condition:
+      while True:
+        if self.closed and not any(self.queues):
+          return None
+
+        for priority, queue in enumerate(self.queues):
+          if not queue:
+            continue
+          if priority < Priority.BULK or self.unsent_bytes() < self.max_unsent:
+            return queue.pop()
+          if self.connection_failed():
+            self.discard()
+          else:
+            self.condition.wait(BULK_POLL_INTERVAL)
+          break
+        else:
+          self.condition.wait()
+
+  def send_frames(self) -> None:
+    """Writes queued frames to the connection until the scheduler closes."""
+    while (frame := self.next_frame()) is not None:
+      try:
+        self.write_frame(frame)
+      except OSError:
+        self.discard()
+        return
+
+      with self.condition:
+        if self.pending:
+          self.pending -= 1
+          self.queued_bytes -= len(frame)
+        self.condition.notify_all()
+
+  @profiler.span("write_frame")
+  def write_frame(self, frame: bytes) -> None:
+    """Writes a frame to the connection, blocking while the socket is full."""
+    self.connection.sendall(frame)
+
+  def discard(self) -> None:
+    """Drops all queued frames and stops accepting new ones."""
+    with self.condition:
+      self.closed = True
+      self.queues = [RoomQueue(queue.quantum) for queue in self.queues]
+      self.pending = 0
+      self.queued_bytes = 0
+      self.condition.notify_all()
+
+  def abort(self) -> None:
+    """Drops all queued frames and shuts the connection down.
+
+    This also wakes a write blocked on a peer that stopped reading.
+    """
+    self.discard()
+    try:
+      self.connection.shutdown(SHUT_RDWR)
+    except OSError:
+      pass
+
+  def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+    """Waits until every queued frame has been written.
+
+    Aborts the connection if that takes longer than timeout seconds. Returns
+    whether every frame was written.
+    """
+    with self.condition:
+      if self.condition.wait_for(lambda: not self.pending, timeout):
+        return True
+    self.abort()
+    return False
+
+  def close(self) -> None:
+    """Sends any queued frames, within the flush timeout, and stops."""
+    self.flush()
+    with self.condition:
+      self.closed = True
+      self.condition.notify_all()
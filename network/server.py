@@ -1,61 +1,238 @@
 from __future__ import annotations
-from threading import Thread
-from threading import active_count as active_threads
-from typing import TYPE_CHECKING, NoReturn
+import os
+import struct
+import sys
+from pathlib import Path
+from select import select
+from socket import AF_UNIX, SOCK_STREAM, SOL_SOCKET, socket
+from threading import Event, Lock, Thread
 
 from chat.message import ChatMessage, MessageType, SystemMessage
-from network.config import Config, ServerConfig
+from network.config import ServerConfig
 from network.connection import ClientConnection, IncomingConnection
 from network.device import Device
+from network.handoff import HandoffState, receive_sockets, send_sockets
+from utilities.profiler import profiler
 
-if TYPE_CHECKING:
-  from socket import socket
+try:
+  from socket import SO_PEERCRED
+except ImportError:    # Linux only, other platforms rely on the socket mode.
+  SO_PEERCRED = None
 
 
 class ChatServer(Device):
   """Chat server relaying chat messages between authorized clients."""
-  config: Config
+  config: ServerConfig
   chats: dict[str, list[socket]]
+  chats_lock: Lock
+  connections: dict[socket, ClientConnection]
+  readers: list[Thread]
+  draining: Event
+  successor: socket | None
 
   def __init__(self, debug: bool = False) -> None:
+    super().__init__()
     self.config = ServerConfig(debug)
     self.chats = {}
+    self.chats_lock = Lock()
+    self.connections = {}
+    self.readers = []
+    self.draining = Event()
+    self.successor = None
 
   @property
   def local_address(self) -> tuple[str, int]:
     """Returns the local address to start the server."""
     return "", self.config.port
 
-  def start_server(self) -> NoReturn:
+  def start_server(self) -> None:
     """Start the server to listen for connections."""
     self.server.bind(self.local_address)
+    self.server.listen()
     print(f"[SERVER STARTED] {self.config.host}:{self.config.port}")
+    self.await_upgrade()
     self.await_incoming_connections()
 
-  def await_incoming_connections(self) -> NoReturn:
-    """Creates a separate thread for each connection to send/receive messages."""
-    self.server.listen()
-    while True:
-      connection: IncomingConnection = self.server.accept()
-      client: ClientConnection = ClientConnection(connection)
-      thread: Thread = Thread(target=self.await_messages, args=(client,))
-      thread.start()
-      print(f"[ACTIVE CONNECTIONS] {active_threads() - 1}")
+  def take_over(self) -> None:
+    """Resume serving the listening socket and clients of a running server."""
+    with socket(AF_UNIX, SOCK_STREAM) as channel:
+      channel.connect(self.config.handoff_path)
+      state, sockets = receive_sockets(channel)
+
+    self.server, clients = sockets[0], sockets[1:]
+    self.restore_state(state, clients)
+    print(f"[SERVER UPGRADED] {self.config.host}:{self.config.port}")
+    self.await_upgrade()
+    self.await_incoming_connections()
+
+  def await_upgrade(self) -> None:
+    """Creates a thread that waits for a new server process to take over."""
+    thread: Thread = Thread(target=self.accept_successor, daemon=True)
+    thread.start()
+
+  def accept_successor(self) -> None:
+    """Waits for a new server process and starts draining connections.
+
+    Only the owner can connect to the handoff socket, and processes run by
+    any other user are turned away.
+    """
+    handoff_path: Path = Path(self.config.handoff_path)
+    handoff_path.unlink(missing_ok=True)
+
+    with socket(AF_UNIX, SOCK_STREAM) as listener:
+      listener.bind(str(handoff_path))
+      handoff_path.chmod(0o600)    # Before listen, so none can connect yet.
+      listener.listen(1)
+
+      while True:
+        successor, _ = listener.accept()
+        if self.is_same_user(successor):
+          break
+        successor.close()
+
+      self.successor = successor
+      handoff_path.unlink()
+
+    print("[SERVER DRAINING]")
+    self.draining.set()
+
+  @staticmethod
+  def is_same_user(connection: socket) -> bool:
+    """Returns whether the peer process runs as the same user as the server.
+
+    Always true where peer credentials are unavailable, in which case only
+    the owner-only mode of the handoff socket keeps other users out.
+    """
+    if SO_PEERCRED is None:
+      return True
+
+    credentials: bytes = connection.getsockopt(SOL_SOCKET, SO_PEERCRED,
+                                               struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+  def await_incoming_connections(self) -> None:
+    """Creates a separate thread for each connection to send/receive messages.
+
+    Stops accepting when draining and hands connections to the new server.
+    """
+    while not self.draining.is_set():
+      if self.is_readable(self.server):
+        connection: IncomingConnection = self.server.accept()
+        self.add_connection(ClientConnection(connection))
+
+    self.hand_off()
+
+  def add_connection(self, connection: ClientConnection) -> None:
+    """Starts listening for messages from a client."""
+    self.connections[connection.client] = connection
+    self.open_connection(connection.client)
+    thread: Thread = Thread(target=self.await_messages, args=(connection,))
+    thread.start()
+    self.readers = [reader for reader in self.readers if reader.is_alive()]
+    self.readers.append(thread)
+    print(f"[ACTIVE CONNECTIONS] {len(self.connections)}")
+
+  def remove_connection(self, connection: ClientConnection) -> None:
+    """Removes a client from all chats and closes the connection."""
+    with self.chats_lock:
+      for clients in self.chats.values():
+        if connection.client in clients:
+          clients.remove(connection.client)
+
+    self.connections.pop(connection.client, None)
+    self.close_connection(connection.client)
+    print(f"[ACTIVE CONNECTIONS] {len(self.connections)}")
+
+  @profiler.idle
+  def is_readable(self, connection: socket) -> bool:
+    """Waits up to the poll interval for a socket to become readable."""
+    readable, _, _ = select([connection], [], [], self.config.poll_interval)
+    return bool(readable)
 
   def await_messages(self, connection: ClientConnection) -> None:
-    """Listens for client messages and sends the appropriate response."""
-    while True:
-      message: SystemMessage | ChatMessage = self.receive_message(
-          connection.client)
-      self.send_response(connection, message)
+    """Listens for client messages and sends the appropriate response.
+
+    Stops between messages when draining, leaving unread data in the socket
+    for the new server.
+    """
+    try:
+      while not self.draining.is_set():
+        if not self.is_readable(connection.client):
+          continue
+
+        message: SystemMessage | ChatMessage = self.receive_message(
+            connection.client)
+        self.send_response(connection, message)
+
+        if message.message_type == MessageType.DISCONNECT:
+          break
+      else:
+        return
+
+    except (OSError, ValueError):
+      pass
+
+    self.remove_connection(connection)
+
+  def hand_off(self) -> None:
+    """Sends the listening socket, clients and chats to the new server."""
+    for reader in self.readers:
+      reader.join()
+
+    for scheduler in list(self.outbound.values()):
+      scheduler.flush()
+
+    assert self.successor
+    clients: list[socket] = list(self.connections)
+    send_sockets(self.successor, self.export_state(clients),
+                 [self.server, *clients])
+    self.successor.close()
+    print("[SERVER HANDED OFF]")
+
+  def export_state(self, clients: list[socket]) -> HandoffState:
+    """Returns connection details and chat membership by client index."""
+    index: dict[socket, int] = {
+        client: number for number, client in enumerate(clients)
+    }
+    with self.chats_lock:
+      chats: dict[str, list[socket]] = {
+          chat_id: list(members) for chat_id, members in self.chats.items()
+      }
 
-      if message.message_type == MessageType.DISCONNECT:
-        break
+    return {
+        "connections": [[
+            self.connections[client].ip,
+            self.connections[client].port,
+            sorted(self.connections[client].encodings),
+        ] for client in clients],
+        "chats": {
+            chat_id: [index[client] for client in members if client in index]
+            for chat_id, members in chats.items()
+        },
+    }
 
+  def restore_state(self, state: HandoffState, clients: list[socket]) -> None:
+    """Rebuilds chats and resumes listening to clients of the old server."""
+    with self.chats_lock:
+      for chat_id, members in state["chats"].items():
+        self.chats[chat_id] = [clients[number] for number in members]
+
+    for (ip, port, encodings), client in zip(state["connections"], clients):
+      connection: ClientConnection = ClientConnection((client, (ip, port)))
+      connection.encodings = set(encodings)
+      self.add_connection(connection)
+
+  @profiler.span("send_response")
   def send_response(self, connection: ClientConnection,
                     message: SystemMessage | ChatMessage) -> None:
-    """Sends appropriate response to the client based on the user's message."""
-    if message.message_type == MessageType.MESSAGE:
+    """Sends appropriate response to the client based on the user's message.
+
+    Chat messages, notices and files are relayed unchanged, so each keeps its
+    priority on the connections to the other members.
+    """
+    if message.message_type in (MessageType.MESSAGE, MessageType.NOTICE,
+                                MessageType.FILE):
       self.send_message_notification(message)
 
     elif message.message_type == MessageType.CONNECT:
@@ -69,29 +246,60 @@ class ChatServer(Device):
     """Connect user to a chatroom and notify all partic."""
 
     print(f"[{connection.ip}:{connection.port}] {message.sender} connected")
-    if message.chat_id in self.chats:
-      self.chats[message.chat_id].append(connection.client)
-    else:
-      self.chats[message.chat_id] = [connection.client]
+    connection.encodings = set(filter(None, message.encoding.split(",")))
+    with self.chats_lock:
+      self.chats.setdefault(message.chat_id, []).append(connection.client)
 
-    self.send_message_notification(message.generate_response())
+    response: SystemMessage | ChatMessage = message.generate_response()
+    response.encoding = self.shared_encodings(message.chat_id)
+    self.send_message_notification(response)
 
   def disconnect_user_from_chat(self, connection: ClientConnection,
                                 message: SystemMessage | ChatMessage) -> None:
     """Notify users when user leaves chatroom."""
     print(f"[{connection.ip}:{connection.port}]{message.sender} disconnected")
-    self.send_message_notification(message.generate_response())
+    response: SystemMessage | ChatMessage = message.generate_response()
+    response.encoding = self.shared_encodings(message.chat_id,
+                                              connection.client)
+    self.send_message_notification(response)
+
+  def shared_encodings(self,
+                       chat_id: str,
+                       leaving: socket | None = None) -> str:
+    """Returns the codecs accepted by every remaining member of a chat."""
+    with self.chats_lock:
+      clients: list[socket] = list(self.chats.get(chat_id, []))
+
+    members: list[set[str]] = [
+        self.connections[client].encodings
+        for client in clients
+        if client is not leaving and client in self.connections
+    ]
+    shared: set[str] = set.intersection(*members) if members else set()
+    return ",".join(sorted(shared))
 
   def send_message_notification(self,
                                 message: SystemMessage | ChatMessage) -> None:
     """Forwards message notification to all users in a chat."""
-    print(f"{message.sender}: {message.contents}")
+    if message.message_type == MessageType.FILE:
+      print(f"{message.sender}: [{len(message.contents)} byte file]")
+    else:
+      print(f"{message.sender}: {message.contents}")
 
-    for recipient in self.chats.get(message.chat_id, []):
+    with self.chats_lock:
+      recipients: list[socket] = list(self.chats.get(message.chat_id, []))
+
+    for recipient in recipients:
       self.send_message(recipient, message)
 
 
 if __name__ == "__main__":
   debug: bool = True
+  upgrade: bool = "--upgrade" in sys.argv
   server: ChatServer = ChatServer(debug)
-  server.start_server()
+  profiler.toggle_on_signal()
+
+  if upgrade:
+    server.take_over()
+  else:
+    server.start_server()
@@ -0,0 +1,278 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from cryptography.fernet import Fernet
+
+from chat.compression import CODECS, Compressor
+from chat.converter import (JSONByteConverter, MessageConverter,
+                            PickleByteConverter, StringByteConverter)
+from chat.encryption import KeyGen, PasswordEncryption, StoredKeyEncryption
+from chat.message import ChatMessage, MessageFactory
+
+BASELINE: Path = Path(__file__).parent / "benchmark_baseline.json"
+SIZES: tuple[int, ...] = (16, 256, 4096, 65536)
+REPEATS: int = 11
+WARMUP_SECONDS: float = 0.05
+NOISE_FLOOR_NS: float = 25.0
+REFERENCE_NUMBER: int = 20
+MEMORY_NUMBER: int = 100
+SAMPLE_TEXT: str = ("The quick brown fox jumps over the lazy dog. "
+                    "Pack my box with five dozen liquor jugs! ")
+SAMPLE_WORDS: list[str] = (
+    "the quick brown fox jumps over lazy dog pack my box with five dozen "
+    "liquor jugs meeting tomorrow deploy server client message room password "
+    "please check logs error fixed thanks lol okay sounds good see you").split()
+
+Operation = Callable[[], Any]
+
+
+def reference_operation() -> None:
+  """A fixed workload whose speed tracks how busy the machine is."""
+  json.loads(json.dumps({str(number): number for number in range(100)}))
+
+
+REFERENCE_TIMER: timeit.Timer = timeit.Timer(reference_operation)
+
+
+@dataclass
+class Result:
+  """Timing and memory cost of a single benchmarked operation.
+
+  ns_per_op is the median across runs and best_ns_per_op the fastest run.
+  relative_cost is the median time relative to the reference workload timed
+  alongside each run, which is what is compared against the baseline.
+  bytes_per_op is what each call allocates for its result, and peak_bytes the
+  most allocated at once during a single call, temporaries included.
+  """
+  name: str
+  ns_per_op: float
+  best_ns_per_op: float
+  relative_cost: float
+  bytes_per_op: int
+  peak_bytes: int
+
+  def __str__(self) -> str:
+    return (f"{self.name:<50} {self.ns_per_op:>14,.0f} ns/op "
+            f"{self.bytes_per_op:>12,} B/op {self.peak_bytes:>12,} B peak")
+
+
+def measure(name: str, operation: Operation) -> Result:
+  """Benchmarks an operation.
+
+  The operation is warmed up, then timed over several runs of equal length,
+  each next to a run of the reference workload so that runs on a busier or
+  throttled machine can be scaled back. Memory per op is the bytes still
+  allocated after up to MEMORY_NUMBER calls whose results are kept, divided
+  by the number of calls.
+  """
+  timer: timeit.Timer = timeit.Timer(operation)
+  number, elapsed = timer.autorange()
+  timer.timeit(max(1, int(number * WARMUP_SECONDS / elapsed)))
+  number = max(1, number // 4)
+
+  runs: list[float] = []
+  relative_runs: list[float] = []
+  for _ in range(REPEATS):
+    reference: float = REFERENCE_TIMER.timeit(REFERENCE_NUMBER)
+    runs.append(timer.timeit(number) / number * 1e9)
+    reference += REFERENCE_TIMER.timeit(REFERENCE_NUMBER)
+    reference_ns: float = reference / (2 * REFERENCE_NUMBER) * 1e9
+    relative_runs.append(runs[-1] / reference_ns)
+
+  calls: int = min(MEMORY_NUMBER, number)
+  kept: list[Any] = [None] * calls
+  tracemalloc.start()
+  baseline, _ = tracemalloc.get_traced_memory()
+  kept[0] = operation()
+  _, peak = tracemalloc.get_traced_memory()
+  for call in range(1, calls):
+    kept[call] = operation()
+  allocated, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  return Result(name, statistics.median(runs), min(runs),
+                statistics.median(relative_runs),
+                max(0, allocated - baseline) // calls, max(0, peak - baseline))
+
+
+def sample_text(size: int) -> str:
+  """Returns chat-like text of the given length."""
+  repeats: int = size // len(SAMPLE_TEXT) + 1
+  return (SAMPLE_TEXT * repeats)[:size]
+
+
+def random_text(size: int) -> str:
+  """Returns text of random words, which does not compress unrealistically."""
+  words: random.Random = random.Random(size)
+  text: str = ""
+  while len(text) < size:
+    text += " ".join(words.choices(SAMPLE_WORDS, k=32)) + ".\n"
+  return text[:size]
+
+
+def wire_size(factory: MessageFactory, text: str) -> int:
+  """Returns the size of the frame payload sent for a chat message."""
+  return len(json.dumps(factory.generate_message(text).jsonify()).encode())
+
+
+def compression_savings() -> Iterator[str]:
+  """Yields the frame bytes saved by each codec across message sizes."""
+  encryption: PasswordEncryption = PasswordEncryption("benchmark")
+  plain: MessageFactory = MessageFactory("user", "room", encryption)
+
+  for codec in CODECS:
+    compressor: Compressor = Compressor(threshold=0, codecs=(codec,))
+    compressor.negotiate(codec)
+    compressed: MessageFactory = MessageFactory("user", "room", encryption,
+                                                compressor)
+
+    for size in SIZES:
+      text: str = random_text(size)
+      before: int = wire_size(plain, text)
+      after: int = wire_size(compressed, text)
+      yield (f"{codec}[{size}]: {before:,} -> {after:,} frame bytes "
+             f"({1 - after / before:.0%} saved)")
+
+
+def benchmarks(workdir: Path) -> Iterator[tuple[str, Operation]]:
+  """Yields the operations that run on every message, across message sizes."""
+  key_path: Path = workdir / "encryption.key"
+  key_path.write_bytes(Fernet.generate_key())
+
+  class TemporaryKeyEncryption(StoredKeyEncryption):
+    path = key_path
+
+  password_encryption: PasswordEncryption = PasswordEncryption("benchmark")
+  stored_encryption: StoredKeyEncryption = TemporaryKeyEncryption()
+  factory: MessageFactory = MessageFactory("user", "room", password_encryption)
+  converters: list[MessageConverter] = [
+      StringByteConverter(),
+      JSONByteConverter(),
+      PickleByteConverter(),
+  ]
+
+  yield "KeyGen.generate_hash", partial(KeyGen.generate_hash, "password",
+                                        "salt")
+
+  for size in SIZES:
+    text: str = sample_text(size)
+    message: ChatMessage = factory.generate_message(text)
+    json_message: dict[str, str] = message.jsonify()
+    password_token: str = password_encryption.encrypt(text)
+    stored_token: str = stored_encryption.encrypt(text)
+
+    yield (f"MessageFactory.generate_message[{size}]",
+           partial(factory.generate_message, text))
+    yield f"Message.jsonify[{size}]", message.jsonify
+    yield (f"MessageFactory.from_json[{size}]",
+           partial(MessageFactory.from_json, json_message))
+    yield (f"PasswordEncryption.encrypt[{size}]",
+           partial(password_encryption.encrypt, text))
+    yield (f"PasswordEncryption.decrypt[{size}]",
+           partial(password_encryption.decrypt, password_token))
+    yield (f"StoredKeyEncryption.encrypt[{size}]",
+           partial(stored_encryption.encrypt, text))
+    yield (f"StoredKeyEncryption.decrypt[{size}]",
+           partial(stored_encryption.decrypt, stored_token))
+
+    for codec in CODECS:
+      compressor: Compressor = Compressor(threshold=0, codecs=(codec,))
+      compressor.negotiate(codec)
+      words: str = random_text(size)
+      compressed, encoding = compressor.compress(words)
+      yield (f"Compressor.compress[{size}][{codec}]",
+             partial(compressor.compress, words))
+      yield (f"Compressor.decompress[{size}][{codec}]",
+             partial(Compressor.decompress, compressed, encoding))
+
+    for converter in converters:
+      data: Any = json_message if converter is not converters[0] else text
+      serialized: bytes = converter.serialize(data)
+      name: str = type(converter).__name__
+      yield f"{name}.serialize[{size}]", partial(converter.serialize, data)
+      yield (f"{name}.deserialize[{size}]",
+             partial(converter.deserialize, serialized))
+
+
+def compare(results: list[Result], baseline: dict[str, dict[str, Any]],
+            threshold: float) -> list[str]:
+  """Returns descriptions of results slower than baseline beyond threshold.
+
+  Costs are compared relative to the reference workload, so a busier or
+  throttled machine is not mistaken for a regression. Slowdowns below the
+  noise floor are ignored.
+  """
+  regressions: list[str] = []
+
+  for result in results:
+    previous: dict[str, Any] | None = baseline.get(result.name)
+    if not previous or "relative_cost" not in previous:
+      continue
+
+    change: float = result.relative_cost / previous["relative_cost"] - 1
+    slowdown: float = result.ns_per_op - previous["ns_per_op"]
+
+    if change > threshold and slowdown > NOISE_FLOOR_NS:
+      regressions.append(f"{result.name}: {previous['ns_per_op']:,.0f} -> "
+                         f"{result.ns_per_op:,.0f} ns/op ({change:+.0%})")
+
+  return regressions
+
+
+def parse_arguments() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Run message micro-benchmarks.")
+  parser.add_argument("--baseline", type=Path, default=BASELINE)
+  parser.add_argument("--save",
+                      action="store_true",
+                      help="save results as the new baseline")
+  parser.add_argument("--threshold",
+                      type=float,
+                      default=0.2,
+                      help="allowed slowdown before flagging a regression")
+  parser.add_argument("--filter",
+                      default="",
+                      help="only run benchmarks whose name contains this")
+  return parser.parse_args()
+
+
+def main() -> int:
+  arguments: argparse.Namespace = parse_arguments()
+  results: list[Result] = []
+
+  with tempfile.TemporaryDirectory() as workdir:
+    for name, operation in benchmarks(Path(workdir)):
+      if arguments.filter in name:
+        results.append(measure(name, operation))
+        print(results[-1])
+
+  baseline: dict[str, dict[str, Any]] = {}
+  if arguments.baseline.exists():
+    baseline = json.loads(arguments.baseline.read_text())
+
+  if "Compressor" in arguments.filter:
+    for savings in compression_savings():
+      print(f"[SAVED] {savings}")
+
+  regressions: list[str] = compare(results, baseline, arguments.threshold)
+  for regression in regressions:
+    print(f"[REGRESSION] {regression}")
+
+  if arguments.save:
+    baseline.update({result.name: asdict(result) for result in results})
+    arguments.baseline.write_text(json.dumps(baseline, indent=2))
+
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
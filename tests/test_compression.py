@@ -0,0 +1,62 @@
+import base64
+import zlib
+import pytest
+
+from chat.compression import Compressor
+
+
+class TestCompressor:
+
+  @pytest.fixture
+  def compressor(self) -> Compressor:
+    compressor = Compressor(threshold=64)
+    compressor.negotiate("lzma,zlib")
+    return compressor
+
+  def test_negotiate(self, compressor: Compressor):
+    assert compressor.offer == "zlib,lzma"
+    assert compressor.accepted == ["zlib", "lzma"]
+    compressor.negotiate("lzma")
+    assert compressor.accepted == ["lzma"]
+    compressor.negotiate("")
+    assert compressor.accepted == []
+
+  def test_below_threshold(self, compressor: Compressor):
+    assert compressor.compress("short message") == ("short message", "")
+
+  def test_not_negotiated(self):
+    assert Compressor(threshold=0).compress("a" * 1000) == ("a" * 1000, "")
+
+  def test_round_trip(self, compressor: Compressor):
+    text = "a long pasted message " * 50
+    compressed, encoding = compressor.compress(text)
+    assert encoding == "zlib"
+    assert len(compressed) < len(text)
+    assert Compressor.decompress(compressed, encoding) == text
+
+  def test_unsupported_encoding(self):
+    with pytest.raises(ValueError):
+      Compressor.decompress("data", "brotli")
+
+  @pytest.mark.parametrize("codec", ["zlib", "lzma"])
+  def test_decompression_limit(self, codec: str):
+    compressor = Compressor(threshold=0, codecs=(codec,))
+    compressor.negotiate(codec)
+    compressed, encoding = compressor.compress("a" * 10000)
+    assert Compressor.decompress(compressed, encoding, limit=10000)
+    with pytest.raises(ValueError):
+      Compressor.decompress(compressed, encoding, limit=9999)
+
+  @pytest.mark.parametrize("codec", ["zlib", "lzma"])
+  def test_malformed(self, codec: str):
+    with pytest.raises(ValueError):
+      Compressor.decompress(base64.b64encode(b"not compressed").decode(), codec)
+
+  def test_truncated(self):
+    truncated = zlib.compress(b"a long pasted message " * 50)[:-8]
+    with pytest.raises(ValueError):
+      Compressor.decompress(base64.b64encode(truncated).decode(), "zlib")
+
+
+if __name__ == "__main__":
+  pytest.main([__file__])
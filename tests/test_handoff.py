@@ -0,0 +1,129 @@
+from pathlib import Path
+from socket import (AF_UNIX, SOCK_STREAM, create_connection, create_server,
+                    socket, socketpair)
+from threading import Thread
+import time
+from typing import Any, Callable
+import pytest
+
+from chat.message import MessageType, SystemMessage
+from network.config import ClientConfig
+from network.connection import ClientConnection
+from network.device import Device
+from network.handoff import receive_sockets, send_sockets
+from network.server import ChatServer
+
+
+def wait_until(condition: Callable[[], Any], timeout: float = 5) -> None:
+  deadline = time.monotonic() + timeout
+  while not condition() and time.monotonic() < deadline:
+    time.sleep(0.01)
+
+
+class TestHandoff:
+
+  def test_sockets_share_connection(self):
+    sender, receiver = socketpair(AF_UNIX)
+    local, remote = socketpair()
+
+    send_sockets(sender, {"chats": {"room": [0]}}, [remote])
+    state, sockets = receive_sockets(receiver)
+    remote.close()
+
+    assert state == {"chats": {"room": [0]}, "sockets": 1}
+    sockets[0].sendall(b"handed off")
+    assert local.recv(16) == b"handed off"
+
+    for sock in (sender, receiver, local, *sockets):
+      sock.close()
+
+  def test_state_round_trip(self):
+    old_server = ChatServer(debug=True)
+    new_server = ChatServer(debug=True)
+    pairs = [socketpair() for _ in range(3)]
+    clients = [client for client, _ in pairs]
+    for number, client in enumerate(clients):
+      connection = ClientConnection((client, ("10.0.0.1", 5000 + number)))
+      connection.encodings = {"zlib", "lzma"} if number else {"zlib"}
+      old_server.connections[client] = connection
+    old_server.chats = {"a": [clients[2], clients[0]], "b": [clients[1]]}
+
+    sender, receiver = socketpair(AF_UNIX)
+    send_sockets(sender, old_server.export_state(clients), clients)
+    state, sockets = receive_sockets(receiver)
+    new_server.restore_state(state, sockets)
+
+    assert new_server.chats == {"a": [sockets[2], sockets[0]],
+                                "b": [sockets[1]]}
+    assert list(new_server.connections) == sockets
+    restored = [new_server.connections[sock] for sock in sockets]
+    assert [connection.port for connection in restored] == [5000, 5001, 5002]
+    assert [connection.encodings for connection in restored] == [
+        {"zlib"}, {"zlib", "lzma"}, {"zlib", "lzma"}
+    ]
+    peers = [peer for _, peer in pairs]
+    for number, (sock, peer) in enumerate(zip(sockets, peers)):
+      sock.sendall(bytes([number]))
+      assert peer.recv(1) == bytes([number])
+
+    new_server.draining.set()
+    for reader in new_server.readers:
+      reader.join()
+    for sock in (sender, receiver, *sockets, *clients, *peers):
+      sock.close()
+
+  def test_take_over(self, tmp_path: Path):
+    old_server = ChatServer(debug=True)
+    new_server = ChatServer(debug=True)
+    for server in (old_server, new_server):
+      server.config.handoff_path = str(tmp_path / "handoff.sock")
+      server.config.poll_interval = 0.01
+    old_server.server = create_server(("localhost", 0))
+
+    old_server.await_upgrade()
+    Thread(target=old_server.await_incoming_connections, daemon=True).start()
+    client = create_connection(old_server.server.getsockname())
+    wait_until(lambda: old_server.connections)
+
+    Thread(target=new_server.take_over, daemon=True).start()
+    wait_until(lambda: new_server.connections)
+    assert old_server.draining.is_set()
+
+    device = Device()
+    device.config = ClientConfig(debug=True)
+    device.open_connection(client)
+    device.send_message(
+        client, SystemMessage("alice", "hi", "room", MessageType.CONNECT))
+    response = device.receive_message(client)
+    assert (response.sender, response.message_type) == ("Server",
+                                                         MessageType.CONNECT)
+    device.close_connection(client)
+    for reader in new_server.readers:
+      reader.join()
+
+  def test_successor_socket_is_private(self, tmp_path: Path):
+    server = ChatServer(debug=True)
+    server.config.handoff_path = str(tmp_path / "handoff.sock")
+    thread = Thread(target=server.accept_successor, daemon=True)
+    thread.start()
+
+    handoff_path = Path(server.config.handoff_path)
+    wait_until(handoff_path.exists)
+    wait_until(lambda: not handoff_path.stat().st_mode & 0o077)
+    assert handoff_path.stat().st_mode & 0o777 == 0o600
+
+    with socket(AF_UNIX, SOCK_STREAM) as successor:
+      successor.connect(str(handoff_path))
+      thread.join(timeout=5)
+      assert server.draining.is_set()
+      server.successor.close()
+
+  def test_same_user(self):
+    local, remote = socketpair(AF_UNIX)
+    assert ChatServer.is_same_user(local)
+    local.close()
+    remote.close()
+
+
+if __name__ == "__main__":
+  pytest.main([__file__])
@@ -0,0 +1,64 @@
+from pathlib import Path
+import pytest
+
+from chat.history import MessageHistory
+
+
+class ReversedEncryption:
+
+  def encrypt(self, data: str) -> str:
+    return data[::-1]
+
+  def decrypt(self, data: str) -> str:
+    return data[::-1]
+
+
+class TestMessageHistory:
+
+  @pytest.fixture
+  def history(self, tmp_path: Path):
+    history = MessageHistory(ReversedEncryption(), b"key",
+                             tmp_path / "history.db")
+    history.add_message("room", "alice", "Hello world")
+    history.add_message("room", "bob", "hello there, Alice")
+    history.add_message("room", "alice", "Anyone seen the world cup?")
+    history.add_message("other", "carol", "hello world")
+    yield history
+    history.close()
+
+  def test_stored_encrypted(self, history: MessageHistory):
+    rows = history.database.execute(
+        "SELECT sender, contents FROM messages").fetchall()
+    assert ("ecila", "dlrow olleH") in rows
+
+  def test_search_keywords(self, history: MessageHistory):
+    assert history.search("room", "HELLO") == [
+        ("alice", "Hello world"),
+        ("bob", "hello there, Alice"),
+    ]
+    assert history.search("room", "hello world") == [("alice", "Hello world")]
+    assert history.search("room", "missing") == []
+
+  def test_search_sender(self, history: MessageHistory):
+    assert history.search("room", sender="alice") == [
+        ("alice", "Hello world"),
+        ("alice", "Anyone seen the world cup?"),
+    ]
+    assert history.search("room", "world", "bob") == []
+
+  def test_search_scoped_to_chat(self, history: MessageHistory):
+    assert history.search("other", "world") == [("carol", "hello world")]
+
+  def test_search_latest(self, history: MessageHistory):
+    assert history.search("room", limit=1) == [
+        ("alice", "Anyone seen the world cup?")
+    ]
+
+  def test_closed(self, history: MessageHistory):
+    history.close()
+    assert history.add_message("room", "alice", "too late") == 0
+    assert history.search("room", "hello") == []
+
+
+if __name__ == "__main__":
+  pytest.main([__file__])
@@ -0,0 +1,96 @@
+import json
+import os
+from pathlib import Path
+import signal
+import threading
+import time
+import pytest
+
+from utilities.profiler import Profiler
+
+
+class TestProfiler:
+
+  @pytest.fixture
+  def profiler(self, tmp_path: Path) -> Profiler:
+    return Profiler(tmp_path / "profile.json", interval=0.001)
+
+  def test_disabled_records_nothing(self, profiler: Profiler):
+    traced = profiler.span("stage")(lambda value: value * 2)
+    assert traced(2) == 4
+    assert profiler.report()["stages"] == {}
+
+  def test_toggle_dumps_stages(self, profiler: Profiler):
+    traced = profiler.span("stage")(lambda value: value * 2)
+    profiler.toggle()
+    traced(1)
+    traced(2)
+    profiler.toggle()
+
+    report = json.loads(profiler.path.read_text())
+    assert report["stages"]["stage"]["count"] == 2
+    assert "stacks" in report
+    assert not profiler.enabled
+
+  def test_idle_threads_are_not_sampled(self, profiler: Profiler):
+    done = threading.Event()
+
+    @profiler.idle
+    def wait_for_input():
+      done.wait()
+
+    def busy():
+      while not done.is_set():
+        sum(range(1000))
+
+    threads = [threading.Thread(target=wait_for_input),
+               threading.Thread(target=done.wait),
+               threading.Thread(target=busy)]
+    for thread in threads:
+      thread.start()
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    done.set()
+    for thread in threads:
+      thread.join()
+
+    stacks = profiler.report()["stacks"]
+    assert any(stack.endswith(":busy") for stack in stacks)
+    assert not any(
+        stack.endswith((":wait_for_input", ":wait", ":_wait_for_tstate_lock"))
+        for stack in stacks)
+
+  def test_restart_runs_one_sampler(self, profiler: Profiler):
+    profiler.interval = 0.05
+    profiler.start()
+    profiler.stop()
+    profiler.start()
+    time.sleep(0.2)
+
+    samplers = [
+        thread for thread in threading.enumerate()
+        if thread.name == "profiler-sampler"
+    ]
+    profiler.stop()
+    assert len(samplers) == 1
+
+  @pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="no SIGUSR1")
+  def test_signal_while_recording(self, profiler: Profiler):
+    previous = signal.getsignal(signal.SIGUSR1)
+    profiler.toggle_on_signal(signal.SIGUSR1)
+    try:
+      with profiler.lock:
+        os.kill(os.getpid(), signal.SIGUSR1)
+      for _ in range(100):
+        if profiler.enabled:
+          break
+        time.sleep(0.01)
+      assert profiler.enabled
+    finally:
+      profiler.stop()
+      signal.signal(signal.SIGUSR1, previous)
+
+
+if __name__ == "__main__":
+  pytest.main([__file__])
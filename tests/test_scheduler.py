@@ -0,0 +1,165 @@
+from socket import create_server, create_connection, socket, socketpair
+import time
+import pytest
+
+from chat.message import ChatMessage, MessageType, SystemMessage
+from network.config import ClientConfig
+from network.device import Device
+from network.scheduler import OutboundScheduler, Priority, RoomQueue
+
+
+class TestRoomQueue:
+
+  def test_round_robin(self):
+    queue = RoomQueue(quantum=2)
+    for frame in (b"a1", b"a2", b"a3"):
+      queue.push("a", [frame])
+    queue.push("b", [b"b1"])
+    assert [queue.pop() for _ in range(4)] == [b"a1", b"b1", b"a2", b"a3"]
+    assert queue.pop() is None
+
+  def test_weights(self):
+    queue = RoomQueue(quantum=2)
+    queue.weights["a"] = 2
+    for frame in (b"a1", b"a2", b"a3"):
+      queue.push("a", [frame])
+    for frame in (b"b1", b"b2"):
+      queue.push("b", [frame])
+    assert [queue.pop() for _ in range(5)] == [
+        b"a1", b"a2", b"b1", b"a3", b"b2"
+    ]
+
+  def test_items_are_contiguous(self):
+    queue = RoomQueue(quantum=1)
+    queue.push("a", [b"a1", b"a2"])
+    queue.push("b", [b"b1"])
+    assert [queue.pop() for _ in range(3)] == [b"b1", b"a1", b"a2"]
+
+
+class TestPriority:
+
+  def test_message_types(self):
+    assert Priority.of(MessageType.CONNECT) == Priority.CONTROL
+    assert Priority.of(MessageType.MESSAGE) == Priority.CHAT
+    assert Priority.of(MessageType.FILE) == Priority.BULK
+
+
+class TestOutboundScheduler:
+
+  def test_unread_peer_is_disconnected(self):
+    sender, receiver = socketpair()
+    scheduler = OutboundScheduler(sender, quantum=1024, max_queued=2**20)
+    for _ in range(64):
+      scheduler.submit([b"x" * 2**16], Priority.CHAT, "room")
+
+    assert scheduler.closed
+    receiver.settimeout(5)
+    while receiver.recv(2**16):
+      pass
+    sender.close()
+    receiver.close()
+
+  def test_flush_deadline(self):
+    sender, receiver = socketpair()
+    scheduler = OutboundScheduler(sender, quantum=1024)
+    scheduler.submit([b"x" * 2**24], Priority.CHAT, "room")
+
+    started = time.monotonic()
+    assert not scheduler.flush(timeout=0.2)
+    assert time.monotonic() - started < 2
+    scheduler.thread.join(timeout=2)
+    assert not scheduler.thread.is_alive()
+    sender.close()
+    receiver.close()
+
+
+class TestDevice:
+
+  @pytest.fixture
+  def device(self) -> Device:
+    device = Device()
+    device.config = ClientConfig(debug=True)
+    device.config.chunk_size = 64
+    return device
+
+  def test_bulk_frames_are_chunked(self, device: Device):
+    frames = device._frame(b"x" * 150, Priority.BULK)
+    assert len(frames) == 3
+    assert device._frame(b"x" * 150, Priority.CHAT) == [
+        b"150".ljust(device.config.header_size) + b"x" * 150
+    ]
+
+  def test_send_and_receive(self, device: Device):
+    sender, receiver = socketpair()
+    device.open_connection(sender)
+    bulk = SystemMessage("alice", "y" * 1000, "room", MessageType.FILE)
+    chat = ChatMessage("bob", "hello", "room")
+
+    device.send_message(sender, bulk)
+    device.send_message(sender, chat)
+
+    received = {device.receive_message(receiver).contents for _ in range(2)}
+    assert received == {"y" * 1000, "hello"}
+    device.close_connection(sender)
+    receiver.close()
+
+  def test_closed_connection_is_skipped(self, device: Device):
+    sender, receiver = socketpair()
+    device.open_connection(sender)
+    device.close_connection(sender)
+    device.send_message(sender, ChatMessage("bob", "hello", "room"))
+    assert device.outbound == {}
+    receiver.close()
+
+  def test_file_is_relayed_as_bulk(self, device: Device):
+    sender, incoming = socketpair()
+    outgoing, recipient = socketpair()
+    device.open_connection(sender)
+    device.open_connection(outgoing)
+    device.send_message(sender, SystemMessage("alice", "y" * 150, "room",
+                                              MessageType.FILE))
+
+    relayed = device.receive_message(incoming)
+    assert relayed.message_type == MessageType.FILE
+    assert Priority.of(relayed.message_type) == Priority.BULK
+    device.send_message(outgoing, relayed)
+
+    flags = []
+    while not flags or flags[-1] != b"$":
+      header = device._receive(recipient, device.config.header_size).strip()
+      flags.append(header[-1:])
+      device._receive(recipient, int(header.rstrip(b"+$")))
+    assert len(flags) > 1 and set(flags[:-1]) == {b"+"}
+
+    device.close_connection(sender)
+    device.close_connection(outgoing)
+    for sock in (incoming, recipient):
+      sock.close()
+
+  def test_chat_does_not_wait_behind_bulk(self, device: Device):
+    device.config.chunk_size = 16384
+    with create_server(("localhost", 0)) as listener:
+      sender: socket = create_connection(listener.getsockname())
+      receiver, _ = listener.accept()
+    device.open_connection(sender)
+
+    bulk = SystemMessage("alice", "y" * 16 * 2**20, "room", MessageType.FILE)
+    device.send_message(sender, bulk)
+    time.sleep(0.3)
+    device.send_message(sender, ChatMessage("bob", "hello", "room"))
+
+    bulk_bytes_ahead: int = 0
+    while True:
+      header = device._receive(receiver, device.config.header_size).strip()
+      payload = device._receive(receiver, int(header.rstrip(b"+$")))
+      if b"hello" in payload:
+        break
+      bulk_bytes_ahead += len(payload)
+
+    assert bulk_bytes_ahead < 2**20
+    receiver.close()
+    device.close_connection(sender)
+
+
+if __name__ == "__main__":
+  pytest.main([__file__])
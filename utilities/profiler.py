@@ -0,0 +1,192 @@
+import json
+import signal
+import sys
+from collections import Counter
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from socket import socket
+from threading import Condition, Event, Lock, Thread, get_ident
+from time import perf_counter_ns
+from types import CodeType, FrameType
+from typing import Any, Callable, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+@dataclass
+class StageTimes:
+  """Accumulated timings of a traced stage in nanoseconds."""
+  count: int = 0
+  total: int = 0
+  maximum: int = 0
+
+  def add(self, elapsed: int) -> None:
+    self.count += 1
+    self.total += elapsed
+    self.maximum = max(self.maximum, elapsed)
+
+
+class Profiler:
+  """Records time spent in traced stages and samples thread stacks.
+
+  Disabled by default. Traced functions only check a flag while disabled, so
+  the hooks can stay in hot paths and be switched on at runtime. Threads
+  waiting in a function marked idle are left out of the sampled stacks.
+  """
+  enabled: bool
+  path: Path
+  interval: float
+  stages: dict[str, StageTimes]
+  stacks: Counter[str]
+  idle_code: set[CodeType]
+  lock: Lock
+  toggle_lock: Lock
+  stopped: Event
+
+  def __init__(self,
+               path: Path = Path("profile.json"),
+               interval: float = 0.01) -> None:
+    self.enabled = False
+    self.path = path
+    self.interval = interval
+    self.stages = {}
+    self.stacks = Counter()
+    self.idle_code = {
+        function.__code__ for function in (
+            Condition.wait,
+            Thread.join,
+            # Where Thread.join blocks before Python 3.13.
+            getattr(Thread, "_wait_for_tstate_lock", Thread.join),
+            socket.accept,
+        )
+    }
+    self.lock = Lock()
+    self.toggle_lock = Lock()
+    self.stopped = Event()
+
+  def span(self, name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Decorator that records the time spent in a function as a stage."""
+
+    def decorator(function: Callable[P, R]) -> Callable[P, R]:
+
+      @wraps(function)
+      def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if not self.enabled:
+          return function(*args, **kwargs)
+
+        start: int = perf_counter_ns()
+        try:
+          return function(*args, **kwargs)
+        finally:
+          self.record(name, perf_counter_ns() - start)
+
+      return wrapper
+
+    return decorator
+
+  def idle(self, function: Callable[P, R]) -> Callable[P, R]:
+    """Decorator marking a function that blocks waiting for input."""
+    self.idle_code.add(function.__code__)
+    return function
+
+  def record(self, name: str, elapsed: int) -> None:
+    """Adds a timing to a stage."""
+    with self.lock:
+      self.stages.setdefault(name, StageTimes()).add(elapsed)
+
+  def start(self) -> None:
+    """Clears previous results and starts tracing and stack sampling.
+
+    Each sampler waits on its own event, so a stopped sampler still exits if
+    profiling restarts before it wakes up.
+    """
+    if self.enabled:
+      return
+
+    with self.lock:
+      self.stages = {}
+      self.stacks = Counter()
+    self.stopped = Event()
+    self.enabled = True
+    Thread(target=self.sample_stacks,
+           args=(self.stopped,),
+           name="profiler-sampler",
+           daemon=True).start()
+
+  def stop(self) -> None:
+    """Stops tracing and writes the results to the profile file."""
+    if not self.enabled:
+      return
+
+    self.enabled = False
+    self.stopped.set()
+    self.dump()
+
+  def toggle(self) -> None:
+    """Starts profiling if stopped, otherwise stops and dumps the results."""
+    with self.toggle_lock:
+      if self.enabled:
+        self.stop()
+      else:
+        self.start()
+
+  def sample_stacks(self, stopped: Event) -> None:
+    """Periodically counts the call stacks of every other busy thread."""
+    sampler: int = get_ident()
+
+    while not stopped.wait(self.interval):
+      # pylint: disable-next=protected-access
+      frames: dict[int, FrameType] = sys._current_frames()
+      samples: list[str] = [
+          self.collapse(frame)
+          for thread, frame in frames.items()
+          if thread != sampler and frame.f_code not in self.idle_code
+      ]
+      with self.lock:
+        self.stacks.update(samples)
+
+  @staticmethod
+  def collapse(frame: FrameType | None) -> str:
+    """Returns a stack as semicolon separated calls, outermost first."""
+    calls: list[str] = []
+    while frame:
+      code: CodeType = frame.f_code
+      calls.append(f"{Path(code.co_filename).name}:{code.co_name}")
+      frame = frame.f_back
+    return ";".join(reversed(calls))
+
+  def report(self) -> dict[str, Any]:
+    """Returns stage timings and sampled stacks."""
+    with self.lock:
+      return {
+          "stages": {
+              name: asdict(times) for name, times in self.stages.items()
+          },
+          "stacks": dict(self.stacks.most_common()),
+      }
+
+  def dump(self) -> None:
+    """Writes stage timings and sampled stacks to the profile file."""
+    self.path.write_text(json.dumps(self.report(), indent=2))
+    print(f"[PROFILE SAVED] {self.path}")
+
+  def toggle_on_signal(self, signal_number: int | None = None) -> None:
+    """Toggles profiling whenever the process receives a signal.
+
+    Defaults to SIGUSR1 where the platform supports it. The handler toggles
+    on a new thread, as the signal may interrupt the main thread while it
+    holds the lock.
+    """
+    signal_number = signal_number or getattr(signal, "SIGUSR1", None)
+    if not signal_number:
+      return
+
+    def handler(*_: Any) -> None:
+      Thread(target=self.toggle, daemon=True).start()
+
+    signal.signal(signal_number, handler)
+
+
+profiler: Profiler = Profiler()